@@ -0,0 +1,39 @@
+#
+# usage: python compare_runs.py {dump json file} {dump json file} [output]
+#
+
+import sys
+import json
+
+from sqa_evaluator.dump_index import diff_runs
+
+
+def show_diff(r):
+    print('Unchanged - {} questions'.format(r['unchanged']))
+    print('Only in the first run - {} questions'.format(r['only a']))
+    print('Only in the second run - {} questions'.format(r['only b']))
+
+    print('Flipped - {} questions'.format(len(r['flipped'])))
+    for k in sorted(r['transitions']):
+        print('  {}: {}'.format(k, r['transitions'][k]))
+
+    for q in r['flipped']:
+        print('* {} ({})'.format(q['nl_query'], q['source']))
+        print('    {} -> {}'.format(': '.join(filter(None, q['a'])),
+                                    ': '.join(filter(None, q['b']))))
+
+
+def main():
+    fn_a, fn_b = sys.argv[1:3]
+
+    r = diff_runs(fn_a, fn_b)
+    show_diff(r)
+
+    if len(sys.argv) > 3:
+        f = open(sys.argv[3], 'w')
+        f.write(json.dumps(r, sort_keys=True, indent=4))
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
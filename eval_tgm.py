@@ -1,12 +1,26 @@
 #
-# usage: python eval_tgm.py {json file} ...
+# usage: python eval_tgm.py [-l {languages}] [-b {batch size}] [-d {database}]
+#                           {json file} ...
 #
 
 import os
-import sys
 import json
+import argparse
 
-from sqa_evaluator.tgm_evaluator import TgmEvaluator
+from sqa_evaluator.tgm_evaluator import TgmEvaluator, MultiLangEvaluator
+from sqa_evaluator import aggregator
+from sqa_evaluator.result_store import ResultStore
+
+# criteria
+ilist = [
+    'broken origin', 'internal error', 'yes-no question', 'factoid question',
+    'range specified'
+]
+clist = [
+    'tgm failure', 'syntax', 'question type (factoid)',
+    'question type (yes-no)', 'disconnected target'
+]
+nlist = ['wrong range', 'disconnected triple']
 
 
 def dump_errors(name, level, data):
@@ -32,7 +46,38 @@ def dump_all(name, data):
     f.close()
 
 
-def show_results(r, ilist, clist, nlist, detail=True):
+def dump_stats(name, stats):
+    ddir = './dump/'
+    if not os.path.exists(ddir):
+        os.mkdir(ddir)
+
+    fn = ddir + '{}-stats.json'.format(name)
+    f = open(fn, 'w')
+    f.write(json.dumps(stats, sort_keys=True, indent=4))
+    f.close()
+
+
+def dump_groups(name, groups):
+    ddir = './dump/'
+    if not os.path.exists(ddir):
+        os.mkdir(ddir)
+
+    fn = ddir + '{}-groups.json'.format(name)
+    f = open(fn, 'w')
+    f.write(json.dumps(groups, sort_keys=True, indent=4))
+    f.close()
+
+
+def ci_str(stats, k):
+    if stats is None or not k in stats['criteria']:
+        return ''
+
+    lo, hi = stats['criteria'][k]['ci']
+    conf = (1 - stats['alpha']) * 100
+    return ' {{{:.0f}% CI: {:.2f}%-{:.2f}%}}'.format(conf, lo * 100, hi * 100)
+
+
+def show_results(r, ilist, clist, nlist, detail=True, stats=None):
     a = r['info']['all']
 
     if len(ilist) > 0:
@@ -52,19 +97,20 @@ def show_results(r, ilist, clist, nlist, detail=True):
             if detail and k in r['ok']:
                 if tmp_a > 0:
                     tmp_par = v / tmp_a * 100
-                    print('  {}: {} [out of {} ({:.2f}%)]'.format(
-                        k, v, tmp_a, tmp_par))
+                    print('  {}: {} [out of {} ({:.2f}%)]{}'.format(
+                        k, v, tmp_a, tmp_par, ci_str(stats, k)))
                 else:
                     print('  {}: {} [out of {}]'.format(k, v, tmp_a))
             else:
-                print('  {}: {}'.format(k, v))
+                print('  {}: {}{}'.format(k, v, ci_str(stats, k)))
 
     if len(clist) > 0:
         val = [r['critical'][i] for i in clist]
         noc = sum(val)
         par = noc / a * 100
 
-        print('Critical - {} queries ({:.2f}%)'.format(noc, par))
+        print('Critical - {} queries ({:.2f}%){}'.format(
+            noc, par, ci_str(stats, 'critical')))
         show_details(r, clist, val, detail)
 
     if len(nlist) > 0:
@@ -72,42 +118,124 @@ def show_results(r, ilist, clist, nlist, detail=True):
         non = sum(val)
         par = non / a * 100
 
-        print('Notice - {} queries ({:.2f}%)'.format(non, par))
+        print('Notice - {} queries ({:.2f}%){}'.format(
+            non, par, ci_str(stats, 'notice')))
         show_details(r, nlist, val, detail)
 
 
-def eval_tgm(name, url, fns):
+def show_groups(groups, clist, nlist):
+    for g, rs in groups.items():
+        print('By {}'.format(g))
+        for k in sorted(rs):
+            a = rs[k]['info']['all']
+            noc = sum([rs[k]['critical'][i] for i in clist])
+            non = sum([rs[k]['notice'][i] for i in nlist])
+            print('  {}: {} questions, critical {} ({:.2f}%), '
+                  'notice {} ({:.2f}%)'.format(k, a, noc, noc / a * 100, non,
+                                               non / a * 100))
+
+
+def report(name, evaluator, store=None):
+    stats = aggregator.aggregate(
+        evaluator.data, ['critical', 'notice'] + clist + nlist,
+        checked=evaluator.result['ok'])
+
+    show_results(
+        evaluator.result, ilist, clist, nlist, detail=True, stats=stats)
+    show_groups(evaluator.groups, clist, nlist)
+
+    dump_errors(name, 'critical', evaluator.data)
+    dump_errors(name, 'notice', evaluator.data)
+    dump_all(name, evaluator.data)
+    dump_stats(name, stats)
+    dump_groups(name, evaluator.groups)
+
+    if store:
+        store.add_run(evaluator)
+
+
+def eval_tgm(name, url, fns, batch_size=1, languages=['en'], store=None):
     print('* Evaluating "{}"'.format(name))
 
-    evaluator = TgmEvaluator(name, url, cache=True)
+    if len(languages) > 1:
+        evaluator = MultiLangEvaluator(
+            name, url, languages, cache=True, batch_size=batch_size)
+        evaluators = evaluator.evaluators
+    else:
+        evaluator = TgmEvaluator(
+            name,
+            url,
+            language=languages[0],
+            cache=True,
+            batch_size=batch_size)
+        evaluators = {languages[0]: evaluator}
 
     evaluator.add_data(fns)
     evaluator.eval()
 
-    ilist = [
-        'broken origin', 'internal error', 'yes-no question',
-        'factoid question', 'range specified'
-    ]
-    clist = [
-        'tgm failure', 'syntax', 'question type (factoid)',
-        'question type (yes-no)', 'disconnected target'
-    ]
-    nlist = ['wrong range', 'disconnected triple']
+    for l in languages:
+        if len(languages) > 1:
+            print('[{}]'.format(l))
+        report(name if l == 'en' else '{}-{}'.format(name, l), evaluators[l],
+               store)
 
-    show_results(evaluator.result, ilist, clist, nlist, detail=True)
+    return evaluators
 
-    dump_errors(name, 'critical', evaluator.data)
-    dump_errors(name, 'notice', evaluator.data)
-    dump_all(name, evaluator.data)
 
+def compare_tgm(ea, eb):
+    print('* Comparing "{}" and "{}" ({})'.format(ea.name, eb.name, ea.lang))
 
-def main():
-    fns = list(reversed(sys.argv[1:]))
+    cmp = aggregator.compare(
+        ea.data,
+        eb.data, ['critical', 'notice'] + clist + nlist,
+        checked=ea.result['ok'])
+
+    print('Paired questions - {}'.format(cmp['questions']))
+    for k, v in cmp['criteria'].items():
+        print('  {}: {:.2f}% -> {:.2f}% ({:+.2f}%) '
+              '[p = {:.4f} (bootstrap), {:.4f} (McNemar)]'.format(
+                  k, v['rate_a'] * 100, v['rate_b'] * 100, v['diff'] * 100,
+                  v['p_bootstrap'], v['p_mcnemar']))
 
-    eval_tgm('rocknrole',
-             'http://ws.okbqa.org:1515/templategeneration/rocknrole', fns)
+    name = '{}-{}'.format(ea.name, eb.name)
+    dump_stats(name if ea.lang == 'en' else '{}-{}'.format(name, ea.lang), cmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate OKBQA-TGMs')
+    parser.add_argument(
+        '-l',
+        '--languages',
+        default='en',
+        help='comma-separated languages to evaluate (default: en)')
+    parser.add_argument(
+        '-b',
+        '--batch-size',
+        type=int,
+        default=1,
+        help='number of questions sent to TGM in one request')
+    parser.add_argument(
+        '-d', '--database', help='SQLite database to store the results in')
+    parser.add_argument('files', nargs='+', help='input json files')
+
+    args = parser.parse_args()
+    fns = list(reversed(args.files))
+    langs = args.languages.split(',')
+    store = ResultStore(args.database) if args.database else None
+
+    ea = eval_tgm('rocknrole',
+                  'http://ws.okbqa.org:1515/templategeneration/rocknrole',
+                  fns, args.batch_size, langs, store)
     print()
-    eval_tgm('lodqa', 'http://lodqa.org/template.json', fns)
+    eb = eval_tgm('lodqa', 'http://lodqa.org/template.json', fns,
+                  args.batch_size, langs, store)
+
+    for l in langs:
+        print()
+        compare_tgm(ea[l], eb[l])
+
+    if store:
+        store.close()
 
 
 if __name__ == '__main__':
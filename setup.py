@@ -7,5 +7,5 @@ setup(
     license='MIT License',
     author='Takuto ASAKURA',
     author_email='asakura@nii.ac.jp',
-    install_requires=['requests', 'rdflib'],
+    install_requires=['requests', 'rdflib', 'numpy'],
     url='https://github.com/wtsnjp/eval_tgm')
@@ -1,5 +1,8 @@
 # package declaration
-__all__ = ['tgm_evaluator']
+__all__ = [
+    'tgm_evaluator', 'aggregator', 'dump_index', 'iri_table', 'json_stream',
+    'result_store'
+]
 
 # logging
 import logging as log
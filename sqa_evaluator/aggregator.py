@@ -0,0 +1,221 @@
+#!/bin/env python
+"""
+Module Aggregator
+
+Statistical aggregation of evaluation results. Verdicts are coded as small
+integers so that bootstrap resampling can be done with NumPy: since a rate
+only depends on the counts of each verdict, resampling N questions is a
+multinomial draw over the counts, which makes 10,000 resamples cheap
+regardless of N.
+"""
+
+import math
+import numpy as np
+
+# verdict codes
+NA, OK, FAILED = 0, 1, 2
+LEVELS = ('critical', 'notice')
+
+
+def verdicts(data, criteria, checked=()):
+    """
+    Encode verdicts of evaluated questions as an integer array
+
+    A criterion in `checked` is applicable only to the questions which
+    passed or failed it explicitly; other criteria (e.g. "syntax") and the
+    levels ("critical", "notice") are applicable to all questions.
+
+    :param data: evaluated data (TgmEvaluator.data after eval())
+    :param criteria: list of criteria or levels
+    :param checked: (optional) criteria counted in the "ok" results
+    :return: int8 array of shape (len(data), len(criteria))
+    """
+
+    col = {c: j for j, c in enumerate(criteria)}
+    default = np.array(
+        [NA if c in checked and not c in LEVELS else OK for c in criteria],
+        dtype=np.int8)
+
+    # questions share a small number of distinct eval dicts, so each one is
+    # reduced to the id of its distinct verdict row
+    keys, ids = dict(), []
+    for d in data:
+        e = d.get('eval', dict())
+        k = (e.get('info', None), e.get('critical', None),
+             e.get('notice', None), tuple(e.get('ok', ())))
+        ids.append(keys.setdefault(k, len(keys)))
+
+    table = np.repeat(default[np.newaxis, :], max(len(keys), 1), axis=0)
+    for (info, critical, notice, passed), i in keys.items():
+        for x in passed:
+            if x in col:
+                table[i, col[x]] = OK
+        for level, r in zip(('info', 'critical', 'notice'),
+                            (info, critical, notice)):
+            if r is None:
+                continue
+            if level in col:
+                table[i, col[level]] = FAILED
+            if r in col:
+                table[i, col[r]] = FAILED
+
+    return table[np.array(ids, dtype=np.int64)].reshape(
+        len(data), len(criteria))
+
+
+def _rates(failed, applicable):
+    return failed / np.maximum(applicable, 1)
+
+
+def _percentile(x, alpha):
+    lo, hi = np.percentile(x, [alpha / 2 * 100, (1 - alpha / 2) * 100])
+    return [float(lo), float(hi)]
+
+
+def aggregate(data,
+              criteria,
+              checked=(),
+              resamples=10000,
+              alpha=0.05,
+              seed=None):
+    """
+    Compute rates of failure with bootstrap confidence intervals
+
+    :param data: evaluated data
+    :param criteria: list of criteria or levels
+    :param checked: (optional) criteria counted in the "ok" results
+    :param resamples: (optional) number of bootstrap resamples
+    :param alpha: (optional) significance level of the intervals
+    :param seed: (optional) seed for the random generator
+    :return: result dict
+    """
+
+    rng = np.random.default_rng(seed)
+    v = verdicts(data, criteria, checked)
+    n = v.shape[0]
+    counts = np.stack([(v == k).sum(axis=0) for k in (NA, OK, FAILED)],
+                      axis=1)
+
+    result = dict()
+    for c, cnt in zip(criteria, counts):
+        applicable = int(cnt[OK] + cnt[FAILED])
+        r = {
+            'failed': int(cnt[FAILED]),
+            'applicable': applicable,
+            'rate': float(cnt[FAILED] / applicable) if applicable else 0.0,
+            'ci': [0.0, 0.0]
+        }
+
+        if applicable > 0:
+            s = rng.multinomial(n, cnt / n, size=resamples)
+            r['ci'] = _percentile(
+                _rates(s[:, FAILED], s[:, OK] + s[:, FAILED]), alpha)
+
+        result[c] = r
+
+    return {
+        'questions': n,
+        'resamples': resamples,
+        'alpha': alpha,
+        'criteria': result
+    }
+
+
+def _mcnemar(b, c):
+    """
+    Two-sided McNemar test for discordant pairs
+
+    :param b: number of pairs passed in the first run and failed in the second
+    :param c: number of pairs failed in the first run and passed in the second
+    :return: p-value
+    """
+
+    n = b + c
+    if n == 0:
+        return 1.0
+
+    # exact binomial test for small samples
+    if n <= 100:
+        f = math.factorial
+        p = sum(f(n) // (f(i) * f(n - i)) for i in range(min(b, c) + 1))
+        return min(1.0, 2 * p / 2**n)
+
+    # chi-square approximation with continuity correction
+    stat = (abs(b - c) - 1)**2 / n
+    return math.erfc(math.sqrt(stat / 2))
+
+
+def compare(data_a,
+            data_b,
+            criteria,
+            checked=(),
+            resamples=10000,
+            alpha=0.05,
+            seed=None):
+    """
+    Paired comparison between two evaluation runs
+
+    Questions are paired by their NL query; questions found in only one of
+    the runs are ignored.
+
+    :param data_a: evaluated data of the first (baseline) run
+    :param data_b: evaluated data of the second run
+    :param criteria: list of criteria or levels
+    :param checked: (optional) criteria counted in the "ok" results
+    :param resamples: (optional) number of bootstrap resamples
+    :param alpha: (optional) significance level of the intervals
+    :param seed: (optional) seed for the random generator
+    :return: result dict
+    """
+
+    rng = np.random.default_rng(seed)
+
+    index = {d['origin']['nl_query']: i for i, d in enumerate(data_b)}
+    ia, ib = [], []
+    for i, d in enumerate(data_a):
+        j = index.get(d['origin']['nl_query'], None)
+        if j is not None:
+            ia.append(i)
+            ib.append(j)
+
+    va = verdicts(data_a, criteria, checked)[ia]
+    vb = verdicts(data_b, criteria, checked)[ib]
+    n = len(ia)
+
+    # joint verdict codes (3 x 3)
+    joint = va.astype(np.int64) * 3 + vb
+
+    result = dict()
+    for j, c in enumerate(criteria):
+        cnt = np.bincount(joint[:, j], minlength=9).reshape(3, 3)
+        a_app, b_app = cnt[1:, :].sum(), cnt[:, 1:].sum()
+        a_rate = cnt[FAILED, :].sum() / a_app if a_app else 0.0
+        b_rate = cnt[:, FAILED].sum() / b_app if b_app else 0.0
+        r = {
+            'rate_a': float(a_rate),
+            'rate_b': float(b_rate),
+            'diff': float(b_rate - a_rate),
+            'ci': [0.0, 0.0],
+            'p_bootstrap': 1.0,
+            'p_mcnemar': _mcnemar(int(cnt[OK, FAILED]), int(cnt[FAILED, OK]))
+        }
+
+        if n > 0:
+            s = rng.multinomial(n, cnt.ravel() / n,
+                                size=resamples).reshape(-1, 3, 3)
+            diff = (_rates(s[:, :, FAILED].sum(axis=1),
+                           s[:, :, 1:].sum(axis=(1, 2))) -
+                    _rates(s[:, FAILED, :].sum(axis=1),
+                           s[:, 1:, :].sum(axis=(1, 2))))
+            r['ci'] = _percentile(diff, alpha)
+            r['p_bootstrap'] = float(
+                min(1.0, 2 * min((diff <= 0).mean(), (diff >= 0).mean())))
+
+        result[c] = r
+
+    return {
+        'questions': n,
+        'resamples': resamples,
+        'alpha': alpha,
+        'criteria': result
+    }
@@ -0,0 +1,158 @@
+#!/bin/env python
+"""
+Module Dump Index
+
+Lightweight indexes of evaluation dumps ((question hash, source) -> verdict)
+and regression diffing between two runs. Dumps are read incrementally, so
+only the index of one run is kept in memory. The same question may appear in
+several source files, so questions are identified by their hash and source
+file, as in the result store.
+"""
+
+from sqa_evaluator import get_logger
+from sqa_evaluator.json_stream import iter_array
+
+import os
+import hashlib
+
+logger = get_logger('dump_index', debug=False)
+
+
+def question_hash(q):
+    """
+    Hash of a question
+
+    :param q: NL query
+    :return: hex digest
+    """
+
+    return hashlib.sha1(q.encode('utf-8')).hexdigest()
+
+
+def verdict(e):
+    """
+    Verdict of an evaluated question
+
+    :param e: eval dict of a question
+    :return: (level, reason) pair
+    """
+
+    for level in ('critical', 'notice'):
+        if level in e:
+            return level, e[level]
+
+    if e.get('info', None) == 'good':
+        return 'good', ''
+
+    return 'info', e.get('info', '')
+
+
+def index_path(fn):
+    return os.path.splitext(fn)[0] + '.idx'
+
+
+def build_index(fn):
+    """
+    Build the index of a dump and write it next to the dump
+
+    :param fn: filename of a dump (dump/{name}-all.json)
+    :return: index dict
+    """
+
+    idx = dict()
+    for d in iter_array(fn):
+        o = d['origin']
+        idx[question_hash(o['nl_query']), o['source']] = verdict(
+            d.get('eval', dict()))
+
+    ifn = index_path(fn)
+    logger.info('Writing an index "{}"'.format(ifn))
+    # an interrupted write must not leave a partial index behind
+    tmp = ifn + '.tmp'
+    with open(tmp, 'w') as f:
+        for (h, source), (level, reason) in idx.items():
+            f.write('{}\t{}\t{}\t{}\n'.format(h, source, level, reason))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ifn)
+
+    return idx
+
+
+def load_index(fn):
+    """
+    Load the index of a dump, building it if missing or outdated
+
+    :param fn: filename of a dump
+    :return: index dict
+    """
+
+    ifn = index_path(fn)
+    if not os.path.exists(ifn) or \
+            os.path.getmtime(ifn) < os.path.getmtime(fn):
+        return build_index(fn)
+
+    logger.info('Loading an index "{}"'.format(ifn))
+    idx = dict()
+    with open(ifn, 'r') as f:
+        for l in f:
+            fields = l.rstrip('\n').split('\t')
+            if not l.endswith('\n') or len(fields) != 4:
+                logger.warning(
+                    'Index "{}" is broken; rebuilding'.format(ifn))
+                return build_index(fn)
+            h, source, level, reason = fields
+            idx[h, source] = (level, reason)
+
+    return idx
+
+
+def diff_runs(fn_a, fn_b):
+    """
+    Find questions whose verdicts differ between two runs
+
+    The index of the first dump is loaded, then the second dump is streamed
+    and compared question by question.
+
+    :param fn_a: filename of the dump of the first (baseline) run
+    :param fn_b: filename of the dump of the second run
+    :return: result dict
+    """
+
+    idx = load_index(fn_a)
+
+    result = {
+        'transitions': dict(),
+        'flipped': [],
+        'only a': 0,
+        'only b': 0,
+        'unchanged': 0
+    }
+
+    for d in iter_array(fn_b):
+        q, source = d['origin']['nl_query'], d['origin']['source']
+        key = (question_hash(q), source)
+        b = verdict(d.get('eval', dict()))
+
+        if not key in idx:
+            result['only b'] += 1
+            continue
+
+        a = idx.pop(key)
+        if a == b:
+            result['unchanged'] += 1
+            continue
+
+        # the level might remain the same with different reasons
+        k = '{} -> {}'.format(a[0], b[0])
+        result['transitions'][k] = result['transitions'].get(k, 0) + 1
+        result['flipped'].append({
+            'nl_query': q,
+            'source': source,
+            'a': list(a),
+            'b': list(b)
+        })
+
+    result['only a'] = len(idx)
+
+    return result
@@ -0,0 +1,131 @@
+#!/bin/env python
+"""
+Module IRI Table
+"""
+
+import sys
+
+
+class IriTable:
+    """
+    Prefix table and interning layer for IRIs
+
+    An IRI is split into a namespace and a local name; each namespace gets
+    a prefix id, and each term gets a term id. Term ids are only valid
+    within the table, while compact names (e.g. "res:Japan") are stable as
+    long as the prefixes are the same.
+    """
+
+    def __init__(self, ns=dict()):
+        """
+        Initialize IRI Table
+
+        :param ns: (optional) dict from prefix names to namespace IRIs
+        """
+
+        # prefix id 0 is for terms without namespace (e.g. variables)
+        self.names = [None]
+        self.namespaces = ['']
+        self.terms = []
+
+        # internal
+        self.__prefixes = {'': 0}
+        self.__by_name = dict()
+        self.__ids = dict()
+
+        for k, v in ns.items():
+            self.add_prefix(k, v)
+
+    def add_prefix(self, name, iri):
+        """
+        Add a prefix to the table
+
+        If the namespace is already known, its prefix name is replaced.
+
+        :param name: prefix name, or None for an anonymous prefix
+        :param iri: namespace IRI
+        :return: prefix id
+        """
+
+        pid = self.__prefixes.get(iri, None)
+        if pid is None:
+            pid = len(self.namespaces)
+            self.__prefixes[iri] = pid
+            self.namespaces.append(iri)
+            self.names.append(None)
+
+        if name is not None:
+            self.names[pid] = name
+            self.__by_name[name] = pid
+
+        return pid
+
+    def split(self, s, add=True):
+        """
+        Split a term into prefix id and local name
+
+        :param s: term (IRI, variable name or literal)
+        :param add: (optional) if False, an unknown namespace is not added
+                    and the whole term is returned with prefix id 0
+        :return: (prefix id, local name) pair
+        """
+
+        i = max(s.rfind('#'), s.rfind('/')) + 1
+        if i == 0:
+            return 0, s
+
+        pid = self.__prefixes.get(s[:i], None)
+        if pid is None:
+            if not add:
+                return 0, s
+            pid = self.add_prefix(None, s[:i])
+
+        return pid, s[i:]
+
+    def intern(self, s):
+        """
+        Get the term id of a term
+
+        A term might be a literal, so no namespace is added to the table.
+
+        :param s: term or compact name
+        :return: term id
+        """
+
+        s = self.expand(s)
+        tid = self.__ids.get(s, None)
+        if tid is None:
+            tid = len(self.terms)
+            self.__ids[s] = tid
+            self.terms.append(self.split(s, add=False))
+
+        return tid
+
+    def compact(self, s):
+        """
+        Abbreviate a term with a named prefix
+
+        :param s: term
+        :return: compact name if the namespace has a name, otherwise s
+        """
+
+        pid, local = self.split(s)
+        name = self.names[pid]
+        if name is None:
+            return sys.intern(s)
+
+        return sys.intern('{}:{}'.format(name, local))
+
+    def expand(self, s):
+        """
+        Expand a compact name
+
+        :param s: compact name or term
+        :return: full term
+        """
+
+        name, sep, local = s.partition(':')
+        if sep and name in self.__by_name:
+            return self.namespaces[self.__by_name[name]] + local
+
+        return s
@@ -0,0 +1,174 @@
+#!/bin/env python
+"""
+Module JSON Stream
+
+Incremental reading of large json arrays from memory-mapped files. Only
+the element being decoded is held in memory, so the memory usage does not
+depend on the size of the file.
+"""
+
+import mmap
+import json
+import codecs
+
+
+class JsonStream:
+    """
+    Reader of json values from a memory-mapped file
+    """
+
+    def __init__(self, mm, chunk_size=1 << 16):
+        """
+        Initialize JSON Stream
+
+        :param mm: memory-mapped file (or bytes)
+        :param chunk_size: (optional) number of bytes decoded at once
+        """
+
+        self.mm = mm
+        self.chunk_size = chunk_size
+
+        # internal
+        self.__off = 0
+        self.__eof = False
+        self.__buf = ''
+        self.__pos = 0
+        self.__dec = json.JSONDecoder()
+        self.__utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def __more(self):
+        chunk = self.mm[self.__off:self.__off + self.chunk_size]
+        self.__off += len(chunk)
+        self.__eof = len(chunk) == 0
+
+        text = self.__utf8.decode(chunk, final=self.__eof)
+        self.__buf = self.__buf[self.__pos:] + text
+        self.__pos = 0
+
+    def peek(self):
+        """
+        Skip whitespaces and get the next character
+
+        :return: next character, or '' at the end of file
+        """
+
+        while True:
+            while self.__pos < len(self.__buf) and \
+                    self.__buf[self.__pos] in ' \t\r\n':
+                self.__pos += 1
+            if self.__pos < len(self.__buf):
+                return self.__buf[self.__pos]
+            if self.__eof:
+                return ''
+            self.__more()
+
+    def expect(self, c):
+        """
+        Consume the next character
+
+        :param c: expected character
+        """
+
+        if self.peek() != c:
+            raise ValueError('Expected "{}" at byte {}'.format(
+                c, self.__off))
+        self.__pos += 1
+
+    def __complete(self, obj, end):
+        """
+        Check if a decoded value cannot continue in the next chunk
+
+        :param obj: decoded value
+        :param end: position after the value
+        :return: True if the value is complete
+        """
+
+        # a number (e.g. "1." or "1e" of "1.5e3") might be cut off anywhere
+        if self.__eof or not isinstance(obj, (int, float)) or \
+                isinstance(obj, bool):
+            return True
+        if end < len(self.__buf):
+            return self.__buf[end] in ',]} \t\r\n'
+
+        return False
+
+    def value(self):
+        """
+        Decode the next json value
+
+        :return: decoded value
+        """
+
+        self.peek()
+        while True:
+            try:
+                obj, end = self.__dec.raw_decode(self.__buf, self.__pos)
+                if self.__complete(obj, end):
+                    self.__pos = end
+                    return obj
+            except ValueError:
+                if self.__eof:
+                    raise
+            self.__more()
+
+    def items(self):
+        """
+        Iterate over the elements of an array
+
+        :return: generator of elements
+        """
+
+        self.expect('[')
+        if self.peek() == ']':
+            self.__pos += 1
+            return
+
+        while True:
+            yield self.value()
+            if self.peek() == ']':
+                self.__pos += 1
+                return
+            self.expect(',')
+
+    def find(self, key):
+        """
+        Move to the value of a key in an object, skipping other values
+
+        :param key: key to find
+        :return: True if the key is found
+        """
+
+        self.expect('{')
+        while self.peek() == '"':
+            k = self.value()
+            self.expect(':')
+            if k == key:
+                return True
+            self.value()
+            if self.peek() != ',':
+                break
+            self.__pos += 1
+
+        return False
+
+
+def iter_array(fn, key=None):
+    """
+    Iterate over the elements of a json array in a file
+
+    :param fn: filename
+    :param key: (optional) if given, the file contains an object and the
+                array of this key is read
+    :return: generator of elements
+    """
+
+    with open(fn, 'rb') as f:
+        # mmap cannot map an empty file
+        if f.seek(0, 2) == 0:
+            raise ValueError('"{}" is empty'.format(fn))
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            js = JsonStream(mm)
+            if key is not None and not js.find(key):
+                return
+            yield from js.items()
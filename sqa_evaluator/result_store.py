@@ -0,0 +1,131 @@
+#!/bin/env python
+"""
+Module Result Store
+
+Export of evaluation results to a local SQLite database, so that results
+of many runs can be sliced with SQL instead of reparsing dumps. The same
+question may appear in several source files (e.g. QALD editions), so
+questions are identified by their hash and source file.
+"""
+
+from sqa_evaluator import get_logger
+from sqa_evaluator.dump_index import question_hash
+
+import time
+import json
+import sqlite3
+
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tgm TEXT NOT NULL,
+    url TEXT,
+    language TEXT NOT NULL,
+    created REAL NOT NULL,
+    result TEXT
+);
+CREATE TABLE IF NOT EXISTS questions (
+    hash TEXT NOT NULL,
+    source TEXT NOT NULL,
+    nl_query TEXT NOT NULL,
+    sparql TEXT,
+    edition TEXT,
+    type TEXT,
+    range TEXT,
+    PRIMARY KEY (hash, source)
+);
+CREATE TABLE IF NOT EXISTS templates (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    question TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status INTEGER,
+    query TEXT,
+    length INTEGER,
+    PRIMARY KEY (run_id, question, source),
+    FOREIGN KEY (question, source) REFERENCES questions(hash, source)
+);
+CREATE TABLE IF NOT EXISTS verdicts (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    question TEXT NOT NULL,
+    source TEXT NOT NULL,
+    level TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    FOREIGN KEY (question, source) REFERENCES questions(hash, source)
+);
+CREATE INDEX IF NOT EXISTS questions_source ON questions(source);
+CREATE INDEX IF NOT EXISTS questions_edition ON questions(edition);
+CREATE INDEX IF NOT EXISTS runs_tgm ON runs(tgm, language);
+CREATE INDEX IF NOT EXISTS verdicts_run ON verdicts(run_id, level, reason);
+CREATE INDEX IF NOT EXISTS verdicts_question ON verdicts(question, source);
+'''
+
+
+class ResultStore:
+    """
+    SQLite database of evaluation results
+    """
+
+    logger = get_logger('result_store', debug=False)
+
+    def __init__(self, fn):
+        """
+        Initialize Result Store
+
+        :param fn: filename of database
+        """
+
+        self.fn = fn
+        self.db = sqlite3.connect(fn)
+        self.db.executescript(schema)
+
+    def add_run(self, evaluator):
+        """
+        Add the results of an evaluated TGM as a new run
+
+        :param evaluator: TgmEvaluator after eval()
+        :return: id of the run
+        """
+
+        questions, templates, verdicts = [], [], []
+
+        for d in evaluator.data:
+            o = d['origin']
+            q = (question_hash(o['nl_query']), o['source'])
+            keys = dict(evaluator.group_keys(d))
+            questions.append(q + (o['nl_query'], o['sparql'], keys['edition'],
+                                  keys['type'], keys['range']))
+
+            t = d['tgm']
+            templates.append(q + (t.get('status', None), t.get(
+                'query', None), t.get('length', None)))
+
+            for level, reason in d.get('eval', dict()).items():
+                if level == 'ok':
+                    verdicts.extend([q + (level, r) for r in reason])
+                else:
+                    verdicts.append(q + (level, reason))
+
+        with self.db:
+            c = self.db.execute(
+                'INSERT INTO runs (tgm, url, language, created, result) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (evaluator.name, evaluator.url, evaluator.lang, time.time(),
+                 json.dumps(evaluator.result, sort_keys=True)))
+            run = c.lastrowid
+
+            self.db.executemany(
+                'INSERT OR IGNORE INTO questions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                questions)
+            self.db.executemany(
+                'INSERT INTO templates VALUES (?, ?, ?, ?, ?, ?)',
+                [(run, ) + t for t in templates])
+            self.db.executemany('INSERT INTO verdicts VALUES (?, ?, ?, ?, ?)',
+                                [(run, ) + v for v in verdicts])
+
+        ResultStore.logger.info('Stored {} questions as run {} in "{}"'.format(
+            len(questions), run, self.fn))
+
+        return run
+
+    def close(self):
+        self.db.close()
@@ -4,13 +4,18 @@ Module TGM Evaluator
 """
 
 from sqa_evaluator import get_logger
+from sqa_evaluator.iri_table import IriTable
+from sqa_evaluator.json_stream import iter_array
 
+import re
 import os
 import json
 import requests
 from functools import reduce
+from concurrent.futures import ThreadPoolExecutor
 
 import pyparsing
+from rdflib import URIRef
 from rdflib.plugins import sparql
 
 
@@ -32,8 +37,17 @@ class TgmEvaluator:
         'onto': 'http://dbpedia.org/ontology/',
         'prop': 'http://dbpedia.org/property/',
     }
-
-    def __init__(self, name, url, language='en', cache=False, ns=dict()):
+    group_names = ['source', 'edition', 'type', 'range']
+    edition_pattern = re.compile(r'(qald-\d+|lcquad)')
+
+    def __init__(self,
+                 name,
+                 url,
+                 language='en',
+                 cache=False,
+                 ns=dict(),
+                 batch_size=1,
+                 checkpoint=100):
         """
         Initialize TGM Evaluator
 
@@ -41,60 +55,91 @@ class TgmEvaluator:
         :param url: REST API's endpoint of TGM
         :param language: (optional) language to use for evaluation
         :param cache: (optional) if True, cache file will be used
+        :param batch_size: (optional) number of questions sent in one request
+        :param checkpoint: (optional) number of questions between checkpoints
         """
 
         self.name = name
         self.url = url
         self.lang = language
+        self.batch_size = max(1, batch_size)
+        self.checkpoint = max(1, checkpoint)
         self.data = []
 
         # internal
+        self.__term_ids = []
         self.__cache = cache
+        self.__current = []
+        self.__batch = None if self.batch_size > 1 else False
         self.__questions = set()
-        self.__ns = TgmEvaluator.default_ns
+        self.__ns = dict(TgmEvaluator.default_ns)
         self.__ns.update(ns)
+        self.iris = IriTable(self.__ns)
 
-    def __load_json_data(self, fn):
+    def __load_json_data(self, fn, languages):
         """
         Load json data
 
+        Questions are read lazily from the memory-mapped file and filtered
+        on the fly.
+
         :param fn: filename
-        :return: result dict
+        :param languages: list of languages
+        :return: generator of dicts, whose nl_query is a dict from language
+                 to NL query
         """
 
-        qs = []
-
         # check extention
         bn, ext = os.path.splitext(os.path.basename(fn))
         if ext != '.json':
             TgmEvaluator.logger.warning(
                 'Input file "{}" is not a json file; skipping'.format(fn))
-            return qs
+            return
 
         # get data from json file
         TgmEvaluator.logger.info('Loading a file "{}"'.format(fn))
-        for e in json.load(open(fn)).get('questions', dict()):
-            tmp_q, tmp_s = None, None
+        for e in iter_array(fn, 'questions'):
+            tmp_q, tmp_s = dict(), None
 
             # NL query (question)
             for q in e.get('question', dict()):
-                if q.get('language', None) == self.lang:
-                    tmp_q = q.get('string', None)
-                    break
+                l = q.get('language', None)
+                if l in languages and not l in tmp_q:
+                    tmp_q[l] = q.get('string', None)
 
             # SPARQL query
             tmp_s = e.get('query', dict()).get('sparql', None)
 
             # use only *good* questions
-            if tmp_q and tmp_s and not tmp_q in self.__questions:
-                qs.append({
+            tmp_q = {
+                l: q
+                for l, q in tmp_q.items()
+                if q and not (l, q) in self.__questions
+            }
+            if tmp_q and tmp_s:
+                self.__questions.update(tmp_q.items())
+                yield {
                     'nl_query': tmp_q,
                     'sparql': tmp_s,
                     'source': bn + ext
-                })
-                self.__questions.add(tmp_q)
+                }
+
+    def __format_tgm(self, raw):
+        """
+        Format a raw TGM output
+
+        :param raw: decoded json output of TGM for a question
+        :return: result dict
+        """
 
-        return qs
+        if isinstance(raw, list):
+            result = raw[0]
+            result['length'] = len(raw)
+        else:
+            result = raw
+            result['length'] = 1
+
+        return result
 
     def __run_tgm(self, query):
         """
@@ -116,13 +161,7 @@ class TgmEvaluator:
             return {'internal_error': True}
 
         if r.status_code == 200:
-            raw = json.loads(r.text)
-            if isinstance(raw, list):
-                result = raw[0]
-                result['length'] = len(raw)
-            else:
-                result = raw
-                result['length'] = 1
+            result = self.__format_tgm(json.loads(r.text))
         else:
             result = {'message': r.text}
 
@@ -130,6 +169,94 @@ class TgmEvaluator:
 
         return result
 
+    def __run_tgm_batch(self, queries):
+        """
+        Run TGM for multiple NL queries in one request
+
+        The endpoint receives a list of inputs and has to return a list of
+        outputs in the same order. Otherwise None is returned, and the
+        caller should fall back to single requests. An empty (or otherwise
+        invalid) output for a question is returned as None, so that the
+        question alone can be retried with a single request.
+
+        :param queries: list of NL queries
+        :return: list of result dicts (or None for failed questions), or None
+        """
+
+        tgm_in = [{'string': q, 'language': self.lang} for q in queries]
+        headers = {'content-type': 'application/json'}
+
+        try:
+            r = requests.post(
+                self.url,
+                headers=headers,
+                data=json.dumps(tgm_in).encode('utf-8'))
+        except UnicodeEncodeError:
+            return None
+
+        if r.status_code != 200:
+            return None
+
+        try:
+            raw = json.loads(r.text)
+        except ValueError:
+            return None
+
+        if not isinstance(raw, list) or len(raw) != len(queries):
+            return None
+
+        results = []
+        for o in raw:
+            if isinstance(o, (list, dict)) and len(o) > 0:
+                result = self.__format_tgm(o)
+                result['status'] = r.status_code
+            else:
+                result = None
+            results.append(result)
+
+        return results
+
+    def __run_tgm_all(self, queries):
+        """
+        Run TGM for all NL queries, in batches if possible
+
+        :param queries: list of NL queries
+        :return: list of result dicts
+        """
+
+        results = []
+
+        for i in range(0, len(queries), self.batch_size):
+            chunk = queries[i:i + self.batch_size]
+
+            if self.__batch is not False and len(chunk) > 1:
+                tmp = self.__run_tgm_batch(chunk)
+                if tmp is not None:
+                    self.__batch = True
+
+                    # retry failed questions one by one
+                    results.extend([
+                        self.__run_tgm(q) if t is None else t
+                        for q, t in zip(chunk, tmp)
+                    ])
+                    continue
+
+                if self.__batch:
+                    # batches worked before; retry this one only
+                    TgmEvaluator.logger.info(
+                        'Batch request to "{}" failed; '
+                        'retrying with single requests'.format(self.url))
+                else:
+                    # the endpoint does not support batches
+                    TgmEvaluator.logger.warning(
+                        'Batch request to "{}" failed; '
+                        'falling back to single requests'.format(self.url))
+                    self.__batch = False
+
+            results.extend([self.__run_tgm(q) for q in chunk])
+
+        return results
+
     def __parse_sparql(self, query):
         """
         Parse SPARQL with rdflib
@@ -159,7 +286,11 @@ class TgmEvaluator:
 
         for k, v in rec(a):
             if k == 'triples':
-                result[k].extend([list(map(str, n)) for n in v])
+                # only IRIs are compacted, so literals add no namespaces
+                result[k].extend([[
+                    self.iris.compact(str(x))
+                    if isinstance(x, URIRef) else str(x) for x in n
+                ] for n in v])
             elif k == 'PV':
                 result['targets'] = [str(t) for t in v]
             elif k == 'var':
@@ -174,96 +305,250 @@ class TgmEvaluator:
 
         return result
 
-    def add_data(self, filenames):
+    def __read_cache(self, fn):
         """
-        Add data in specified files
+        Read a cache file
 
-        :param filenames: list of dataset filenames
+        :param fn: filename of cache
+        :return: cached data, or None if not available
         """
 
-        for fn in filenames:
-            origin, tgm = None, None
+        if not os.path.exists(fn):
+            return None
 
-            # use cache file if exists
-            if self.__cache:
-                cdir = './cache/'
-                if not os.path.exists(cdir):
-                    os.mkdir(cdir)
+        TgmEvaluator.logger.info('Loading a cache "{}"'.format(fn))
+        try:
+            with open(fn, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            TgmEvaluator.logger.warning(
+                'Cache "{}" is broken; ignoring'.format(fn))
+            return None
 
-                bn, ext = os.path.splitext(os.path.basename(fn))
-                ocf = cdir + '{}-origin.json'.format(bn)
-                tcf = cdir + '{}-{}.json'.format(bn, self.name)
+    def __write_cache(self, fn, data):
+        """
+        Write a cache file atomically
 
-                if os.path.exists(ocf):
-                    TgmEvaluator.logger.info(
-                        'Loading a cache "{}"'.format(ocf))
-                    f = open(ocf, 'r')
-                    origin = json.load(f)
-                    f.close()
+        :param fn: filename of cache
+        :param data: data to be cached
+        """
 
-                if os.path.exists(tcf):
-                    TgmEvaluator.logger.info(
-                        'Loading a cache "{}"'.format(tcf))
-                    f = open(tcf, 'r')
-                    tgm = json.load(f)
-                    f.close()
-
-            # get origin
-            if origin is None:
-                dataset = self.__load_json_data(fn)
-                parsed = [self.__parse_sparql(d['sparql']) for d in dataset]
-                origin = [{
-                    'origin': d,
-                    'origin_parsed': p
-                } for d, p in zip(dataset, parsed)]
+        tmp = fn + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(data, sort_keys=True, indent=4))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, fn)
 
-            # get tgm
-            if tgm is None:
-                templates = [
-                    self.__run_tgm(d['origin']['nl_query']) for d in origin
-                ]
-                parsed = [
-                    self.__parse_sparql(t.get('query', '')) for t in templates
-                ]
-                tgm = [{
+    def __read_checkpoint(self, fn, queries):
+        """
+        Read a checkpoint log, dropping a truncated last record
+
+        A record is valid only if its line is terminated by a newline;
+        reading stops at the first invalid record.
+
+        :param fn: filename of checkpoint log
+        :param queries: list of NL queries
+        :return: dict from index to TGM result
+        """
+
+        done = dict()
+        if not os.path.exists(fn):
+            return done
+
+        TgmEvaluator.logger.info('Resuming from a checkpoint "{}"'.format(fn))
+        offset = 0
+        with open(fn, 'rb') as f:
+            for l in f:
+                if not l.endswith(b'\n'):
+                    break
+                try:
+                    r = json.loads(l.decode('utf-8'))
+                except ValueError:
+                    break
+                if not isinstance(r, dict) or False in [
+                        k in r
+                        for k in ('index', 'nl_query', 'tgm', 'tgm_parsed')
+                ] or not isinstance(r['index'], int):
+                    break
+                offset += len(l)
+
+                i = r['index']
+                if 0 <= i < len(queries) and r['nl_query'] == queries[i]:
+                    done[i] = {'tgm': r['tgm'], 'tgm_parsed': r['tgm_parsed']}
+
+        # remove incomplete data so that new records can be appended
+        with open(fn, 'ab') as f:
+            f.truncate(offset)
+
+        return done
+
+    def __get_tgm(self, queries, lcf=None):
+        """
+        Get TGM results for NL queries
+
+        If a checkpoint log is given, results are appended to it as they
+        are fetched, and the results already in it are not fetched again.
+
+        :param queries: list of NL queries
+        :param lcf: (optional) filename of checkpoint log
+        :return: list of TGM result dicts
+        """
+
+        done = self.__read_checkpoint(lcf, queries) if lcf else dict()
+        tgm = [done.get(i, None) for i in range(len(queries))]
+        todo = [i for i in range(len(queries)) if tgm[i] is None]
+
+        # checkpoint at batch boundaries
+        step = -(-self.checkpoint // self.batch_size) * self.batch_size
+
+        log = open(lcf, 'a') if lcf else None
+        for k in range(0, len(todo), step):
+            idx = todo[k:k + step]
+            templates = self.__run_tgm_all([queries[i] for i in idx])
+
+            for i, t in zip(idx, templates):
+                tgm[i] = {
                     'tgm': t,
-                    'tgm_parsed': p
-                } for t, p in zip(templates, parsed)]
+                    'tgm_parsed': self.__parse_sparql(t.get('query', ''))
+                }
+                if log:
+                    log.write(
+                        json.dumps({
+                            'index': i,
+                            'nl_query': queries[i],
+                            **tgm[i]
+                        }) + '\n')
+
+            if log:
+                log.flush()
+                os.fsync(log.fileno())
+
+        if log:
+            log.close()
+
+        return tgm
+
+    def __cache_files(self, fn, lang):
+        """
+        Get filenames of cache
+
+        :param fn: dataset filename
+        :param lang: language
+        :return: filenames of origin cache, TGM cache and checkpoint log
+        """
+
+        cdir = './cache/'
+        if not os.path.exists(cdir):
+            os.mkdir(cdir)
+
+        bn, ext = os.path.splitext(os.path.basename(fn))
+        sfx = '' if lang == 'en' else '-' + lang
+
+        return (cdir + '{}-origin{}.json'.format(bn, sfx),
+                cdir + '{}-{}{}.json'.format(bn, self.name, sfx),
+                cdir + '{}-{}{}.log'.format(bn, self.name, sfx))
+
+    def load_origin(self, fn, languages=None):
+        """
+        Load questions in a file and parse their SPARQL queries
+
+        Each SPARQL query is parsed only once, even if questions in several
+        languages are loaded.
+
+        :param fn: dataset filename
+        :param languages: (optional) list of languages (default: [self.lang])
+        :return: dict from language to list of origin dicts
+        """
+
+        languages = languages or [self.lang]
+        origins, todo = dict(), []
+
+        # use cache file if exists
+        for l in languages:
+            if self.__cache:
+                origins[l] = self.__read_cache(self.__cache_files(fn, l)[0])
+            if origins.get(l, None) is None:
+                todo.append(l)
+
+        if len(todo) < 1:
+            return origins
+
+        for l in todo:
+            origins[l] = []
+
+        for d in self.__load_json_data(fn, todo):
+            p = self.__parse_sparql(d['sparql'])
+            for l, q in d['nl_query'].items():
+                origins[l].append({
+                    'origin': {
+                        'nl_query': q,
+                        'sparql': d['sparql'],
+                        'source': d['source']
+                    },
+                    'origin_parsed': p
+                })
+
+        for l in todo:
+            if self.__cache:
+                self.__write_cache(self.__cache_files(fn, l)[0], origins[l])
+
+        return origins
 
-            # add data
-            self.data.extend([{**o, **t} for o, t in zip(origin, tgm)])
-            TgmEvaluator.logger.info('Prepared {} queries from "{}"'.format(
-                len(tgm), fn))
+    def add_origin(self, fn, origin):
+        """
+        Run TGM for loaded questions and add them to data
+
+        :param fn: dataset filename
+        :param origin: list of origin dicts (from load_origin)
+        """
+
+        tgm, lcf = None, None
+
+        # use cache file if exists
+        if self.__cache:
+            ocf, tcf, lcf = self.__cache_files(fn, self.lang)
+            tgm = self.__read_cache(tcf)
+
+        # get tgm
+        if tgm is None:
+            tgm = self.__get_tgm([d['origin']['nl_query'] for d in origin],
+                                 lcf)
 
-            # write cache
             if self.__cache:
-                if not os.path.exists(ocf):
-                    f = open(ocf, 'w')
-                    f.write(json.dumps(origin, sort_keys=True, indent=4))
-                    f.close()
+                self.__write_cache(tcf, tgm)
+                os.remove(lcf)
+
+        # add data
+        self.data.extend([{**o, **t} for o, t in zip(origin, tgm)])
+        self.__term_ids.extend([self.__intern(t['tgm_parsed']) for t in tgm])
+        TgmEvaluator.logger.info('Prepared {} queries from "{}"'.format(
+            len(tgm), fn))
+
+    def add_data(self, filenames):
+        """
+        Add data in specified files
+
+        :param filenames: list of dataset filenames
+        """
 
-                if not os.path.exists(tcf):
-                    f = open(tcf, 'w')
-                    f.write(json.dumps(tgm, sort_keys=True, indent=4))
-                    f.close()
+        for fn in filenames:
+            self.add_origin(fn, self.load_origin(fn)[self.lang])
 
         TgmEvaluator.logger.info('Current data size: {}'.format(
             len(self.data)))
 
-    def __update(self, i, level, reason):
-        self.result[level][reason] += 1
-        self.data[i]['eval'].update({level: reason})
-
-    def eval(self):
+    def __new_result(self, size=0):
         """
-        Evaluate the TGM
+        Create an empty result dict
 
+        :param size: number of questions
         :return: result dict
         """
 
-        self.result = {
+        return {
             'info': {
-                'all': len(self.data),
+                'all': size,
                 'internal error': 0,
                 'broken origin': 0,
                 'yes-no question': 0,
@@ -290,9 +575,93 @@ class TgmEvaluator:
             }
         }
 
+    def group_keys(self, d):
+        """
+        Get the groups a question belongs to
+
+        :param d: data of a question
+        :return: list of (group, key) pairs
+        """
+
+        source = d['origin'].get('source', 'unknown')
+        op = d['origin_parsed']
+
+        m = TgmEvaluator.edition_pattern.match(source)
+        edition = m.group(1) if m else os.path.splitext(source)[0]
+
+        if op.get('syntax_error', False):
+            qtype = 'broken'
+        elif op['ask_query']:
+            qtype = 'ASK'
+        else:
+            qtype = 'SELECT'
+
+        if op.get('length', -1) >= 0:
+            qrange = 'range specified'
+        else:
+            qrange = 'no range'
+
+        return [('source', source), ('edition', edition), ('type', qtype),
+                ('range', qrange)]
+
+    def __intern(self, tp):
+        """
+        Get term ids of a parsed template
+
+        Term ids are kept in memory only, since they are valid only within
+        self.iris; parse results keep compact names for caches and dumps.
+
+        :param tp: parse result of a template
+        :return: (triples, targets) of term ids, or None for a template
+                 which is not checked for connectivity
+        """
+
+        if tp.get('syntax_error', False) or tp['ask_query']:
+            return None
+
+        intern = self.iris.intern
+        triples = [[intern(n) for n in t] for t in tp['triples']]
+        targets = [
+            intern(tp['binds'].get(t, t)) for t in tp.get('targets', [])
+        ]
+
+        return triples, targets
+
+    def __count(self, level, reason):
+        for r in [self.result] + self.__current:
+            r[level][reason] += 1
+
+    def __update(self, i, level, reason):
+        self.__count(level, reason)
+        self.data[i]['eval'].update({level: reason})
+
+    def __pass(self, i, reason):
+        self.__count('ok', reason)
+        self.data[i]['eval'].setdefault('ok', []).append(reason)
+
+    def eval(self):
+        """
+        Evaluate the TGM
+
+        Besides the global result, the results grouped by source file,
+        dataset edition, question type and range specification are stored
+        in self.groups.
+
+        :return: result dict
+        """
+
+        self.result = self.__new_result(len(self.data))
+        self.groups = {g: dict() for g in TgmEvaluator.group_names}
+
         for i in range(len(self.data)):
             # initialize
             self.data[i]['eval'] = dict()
+            self.__current = []
+            for g, k in self.group_keys(self.data[i]):
+                if not k in self.groups[g]:
+                    self.groups[g][k] = self.__new_result()
+                self.__current.append(self.groups[g][k])
+                self.groups[g][k]['info']['all'] += 1
 
             t = self.data[i]['tgm']
             op = self.data[i]['origin_parsed']
@@ -308,13 +677,13 @@ class TgmEvaluator:
             if not broken:
                 yes_no = op['ask_query']
                 if yes_no:
-                    self.result['info']['yes-no question'] += 1
+                    self.__count('info', 'yes-no question')
                 else:
-                    self.result['info']['factoid question'] += 1
+                    self.__count('info', 'factoid question')
 
                 o_len, o_off = op.get('length', -1), op.get('start', -1)
                 if o_len >= 0:
-                    self.result['info']['range specified'] += 1
+                    self.__count('info', 'range specified')
 
             # internal
             if t.get('internal_error', False):
@@ -345,19 +714,19 @@ class TgmEvaluator:
                 continue
             else:
                 if yes_no:
-                    self.result['ok']['question type (yes-no)'] += 1
+                    self.__pass(i, 'question type (yes-no)')
                 else:
-                    self.result['ok']['question type (factoid)'] += 1
+                    self.__pass(i, 'question type (factoid)')
 
             # disconnected target
             if not ask:
-                nodes = [v for t in tp['triples'] for v in t]
-                targets = [tp['binds'].get(t, t) for t in tp['targets']]
+                triples, targets = self.__term_ids[i]
+                nodes = set([v for t in triples for v in t])
                 if False in map(lambda t: t in nodes, targets):
                     self.__update(i, 'critical', 'disconnected target')
                     continue
                 else:
-                    self.result['ok']['disconnected target'] += 1
+                    self.__pass(i, 'disconnected target')
 
             # length and offset
             if o_len >= 0:
@@ -366,12 +735,12 @@ class TgmEvaluator:
                     self.__update(i, 'notice', 'wrong range')
                     continue
                 else:
-                    self.result['ok']['wrong range'] += 1
+                    self.__pass(i, 'wrong range')
 
             # disconnected triples
             if not ask:
                 seen = []
-                for t in tp['triples']:
+                for t in triples:
                     idx = [
                         k for k in [
                             j
@@ -393,7 +762,65 @@ class TgmEvaluator:
                     self.__update(i, 'notice', 'disconnected triple')
                     continue
                 else:
-                    self.result['ok']['disconnected triple'] += 1
+                    self.__pass(i, 'disconnected triple')
 
             # good
             self.data[i]['eval']['info'] = 'good'
+
+
+class MultiLangEvaluator:
+    """
+    Evaluator for specified TGM and multiple languages
+    """
+
+    def __init__(self, name, url, languages, **kwargs):
+        """
+        Initialize Multi-language Evaluator
+
+        :param name: name of TGM
+        :param url: REST API's endpoint of TGM
+        :param languages: list of languages to use for evaluation
+        :param kwargs: (optional) other options for TgmEvaluator
+        """
+
+        self.name = name
+        self.url = url
+        self.langs = list(languages)
+        self.evaluators = {
+            l: TgmEvaluator(name, url, language=l, **kwargs)
+            for l in self.langs
+        }
+
+    def add_data(self, filenames):
+        """
+        Add data in specified files
+
+        Each file is loaded once, and TGM is run for all languages
+        concurrently.
+
+        :param filenames: list of dataset filenames
+        """
+
+        loader = self.evaluators[self.langs[0]]
+
+        with ThreadPoolExecutor(max_workers=len(self.langs)) as ex:
+            for fn in filenames:
+                origins = loader.load_origin(fn, self.langs)
+                fs = [
+                    ex.submit(self.evaluators[l].add_origin, fn, origins[l])
+                    for l in self.langs
+                ]
+                for f in fs:
+                    f.result()
+
+    def eval(self):
+        """
+        Evaluate the TGM for all languages
+        """
+
+        for l in self.langs:
+            self.evaluators[l].eval()
+
+    @property
+    def result(self):
+        return {l: self.evaluators[l].result for l in self.langs}
@@ -0,0 +1,197 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from sqa_evaluator.tgm_evaluator import TgmEvaluator
+
+SPARQL = 'SELECT ?x WHERE {{ ?x <http://example.org/p{}> ?y }}'
+
+
+class Response:
+    def __init__(self, body):
+        self.status_code = 200
+        self.text = json.dumps(body)
+
+
+class StandIn:
+    """
+    Replacement of requests.post, recording the questions it was asked
+    """
+
+    def __init__(self, log=None, fail_after=None):
+        self.asked = []
+        self.calls = []
+        self.log = log
+        self.fail_after = fail_after
+
+    def output(self, q):
+        i = int(q['string'].split()[-1])
+        return [{'query': SPARQL.format(i), 'score': 1.0}]
+
+    def __call__(self, url, headers=None, data=None):
+        if self.fail_after is not None and len(self.calls) >= self.fail_after:
+            raise RuntimeError('interrupted')
+
+        tgm_in = json.loads(data.decode('utf-8'))
+        batch = isinstance(tgm_in, list)
+        qs = tgm_in if batch else [tgm_in]
+
+        # number of records in the checkpoint log when a request is sent
+        lines = 0
+        if self.log and os.path.exists(self.log):
+            lines = len(open(self.log).readlines())
+        self.calls.append((len(qs), lines))
+        self.asked.extend([q['string'] for q in qs])
+
+        outs = [self.output(q) for q in qs]
+        return Response(outs if batch else outs[0])
+
+
+class CheckpointTest(unittest.TestCase):
+    size = 7
+
+    def setUp(self):
+        # cache files are written to ./cache/
+        self.cwd = os.getcwd()
+        self.wd = tempfile.mkdtemp()
+        os.chdir(self.wd)
+
+        self.questions = [
+            'Question number {}'.format(i) for i in range(self.size)
+        ]
+        with open('test.json', 'w') as f:
+            json.dump({
+                'questions': [{
+                    'question': [{
+                        'language': 'en',
+                        'string': q
+                    }],
+                    'query': {
+                        'sparql': SPARQL.format(i)
+                    }
+                } for i, q in enumerate(self.questions)]
+            }, f)
+
+        self.tcf = 'cache/test-t.json'
+        self.lcf = 'cache/test-t.log'
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.wd)
+
+    def run_tgm(self, stand_in, **kwargs):
+        e = TgmEvaluator('t', 'http://tgm', cache=True, **kwargs)
+        with mock.patch('sqa_evaluator.tgm_evaluator.requests.post',
+                        stand_in):
+            e.add_data(['test.json'])
+        return e
+
+    def record(self, i, q=None):
+        return json.dumps({
+            'index': i,
+            'nl_query': q or self.questions[i],
+            'tgm': {
+                'query': SPARQL.format(i),
+                'score': 1.0,
+                'length': 1,
+                'status': 200
+            },
+            'tgm_parsed': {
+                'ask_query': False,
+                'triples': [['x', 'http://example.org/p{}'.format(i), 'y']],
+                'binds': {},
+                'targets': ['x']
+            }
+        }) + '\n'
+
+    def write_log(self, text):
+        os.mkdir('cache')
+        with open(self.lcf, 'w') as f:
+            f.write(text)
+
+    def test_resume_from_cut_log(self):
+        # the last record was cut off while being written
+        cut = self.record(3)
+        self.write_log(''.join([self.record(i) for i in range(3)]) +
+                       cut[:len(cut) // 2])
+
+        stand_in = StandIn()
+        e = self.run_tgm(stand_in)
+
+        self.assertEqual(stand_in.asked, self.questions[3:])
+        self.assertEqual(len(e.data), self.size)
+        self.assertEqual(
+            [d['tgm']['query'] for d in e.data],
+            [SPARQL.format(i) for i in range(self.size)])
+
+        # the log is removed once the cache is written
+        self.assertFalse(os.path.exists(self.lcf))
+        self.assertEqual(len(json.load(open(self.tcf))), self.size)
+
+    def test_record_without_newline(self):
+        # a complete json record is still dropped without its newline
+        self.write_log(self.record(0) + self.record(1).rstrip('\n'))
+
+        stand_in = StandIn()
+        self.run_tgm(stand_in)
+
+        self.assertEqual(stand_in.asked, self.questions[1:])
+
+    def test_records_matched_by_question(self):
+        # records of another dataset (or an outdated one) are ignored
+        self.write_log(
+            self.record(0) + self.record(1, 'Another question') +
+            self.record(2) + self.record(self.size + 1, 'Question number 9'))
+
+        stand_in = StandIn()
+        self.run_tgm(stand_in)
+
+        self.assertEqual(stand_in.asked,
+                         [self.questions[1]] + self.questions[3:])
+
+    def test_truncate_log(self):
+        cut = self.record(2)
+        self.write_log(self.record(0) + self.record(1) + cut[:-10])
+
+        with self.assertRaises(RuntimeError):
+            self.run_tgm(StandIn(fail_after=0))
+
+        # the cut record is removed so that new records can be appended
+        self.assertEqual(
+            open(self.lcf).read(),
+            self.record(0) + self.record(1))
+
+    def test_interrupted_run(self):
+        stand_in = StandIn(log=self.lcf, fail_after=5)
+        with self.assertRaises(RuntimeError):
+            self.run_tgm(stand_in, checkpoint=2)
+
+        # checkpoints are written every 2 questions
+        lines = open(self.lcf).readlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual([json.loads(l)['index'] for l in lines],
+                         list(range(4)))
+        self.assertFalse(os.path.exists(self.tcf))
+
+        stand_in = StandIn()
+        e = self.run_tgm(stand_in, checkpoint=2)
+
+        self.assertEqual(stand_in.asked, self.questions[4:])
+        self.assertEqual(len(e.data), self.size)
+        self.assertFalse(os.path.exists(self.lcf))
+
+    def test_checkpoint_at_batch_boundaries(self):
+        stand_in = StandIn(log=self.lcf)
+        self.run_tgm(stand_in, batch_size=3, checkpoint=2)
+
+        # the interval is rounded up to 3, so batches are not split and
+        # every checkpoint holds whole batches
+        self.assertEqual(stand_in.calls, [(3, 0), (3, 3), (1, 6)])
+        self.assertEqual(stand_in.asked, self.questions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import json
+import random
+import tempfile
+import unittest
+
+from sqa_evaluator.json_stream import JsonStream, iter_array
+
+
+def random_value(rnd, depth=0):
+    kinds = ['int', 'float', 'exp', 'str', 'bool', 'null']
+    if depth < 3:
+        kinds += ['list', 'dict']
+
+    k = rnd.choice(kinds)
+    if k == 'int':
+        return rnd.randint(-10**12, 10**12)
+    if k == 'float':
+        return rnd.uniform(-1000, 1000)
+    if k == 'exp':
+        return rnd.choice([1.5e-7, -2.25e21, 3e100])
+    if k == 'str':
+        return ''.join(rnd.choice('ab"\\/ 日本é\n') for _ in range(5))
+    if k == 'bool':
+        return rnd.random() < 0.5
+    if k == 'null':
+        return None
+    if k == 'list':
+        return [random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))]
+    return {
+        'k{}'.format(i): random_value(rnd, depth + 1)
+        for i in range(rnd.randint(0, 4))
+    }
+
+
+def encode(obj, rnd):
+    return json.dumps(
+        obj, indent=rnd.choice([None, 4]),
+        ensure_ascii=rnd.random() < 0.5).encode('utf-8')
+
+
+class JsonStreamTest(unittest.TestCase):
+    def test_numbers_across_chunks(self):
+        src = b'[1.5, 2, -3e2, 4E+1, 0.25e-1, true, false, null]'
+        expected = json.loads(src.decode('utf-8'))
+        for c in range(1, len(src) + 1):
+            self.assertEqual(
+                list(JsonStream(src, chunk_size=c).items()), expected)
+
+    def test_round_trip(self):
+        rnd = random.Random(0)
+        for _ in range(300):
+            arr = [random_value(rnd) for _ in range(rnd.randint(0, 8))]
+            js = JsonStream(encode(arr, rnd), chunk_size=rnd.randint(1, 17))
+            self.assertEqual(list(js.items()), arr)
+
+    def test_find_skips_values(self):
+        rnd = random.Random(1)
+        for _ in range(300):
+            obj = {
+                'before': random_value(rnd),
+                'count': rnd.uniform(-1, 1) * 10**rnd.randint(0, 20),
+                'questions': [random_value(rnd) for _ in range(3)],
+                'after': random_value(rnd)
+            }
+            js = JsonStream(encode(obj, rnd), chunk_size=rnd.randint(1, 17))
+            self.assertTrue(js.find('questions'))
+            self.assertEqual(list(js.items()), obj['questions'])
+
+    def test_missing_key(self):
+        js = JsonStream(b'{"a": 1.5, "b": [1, 2]}', chunk_size=2)
+        self.assertFalse(js.find('questions'))
+
+    def test_empty_array(self):
+        self.assertEqual(list(JsonStream(b' [ ] ', chunk_size=1).items()), [])
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(JsonStream(b'[{"a": 1}, {"b":', chunk_size=4).items())
+
+    def test_iter_array(self):
+        obj = {'dataset': {'id': 'x'}, 'questions': [{'q': 1}, {'q': 2.5}]}
+        fd, fn = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(obj, f)
+            self.assertEqual(
+                list(iter_array(fn, 'questions')), obj['questions'])
+        finally:
+            os.remove(fn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,266 @@
+#
+# usage: python generate_synthetic_data.py generate [options]
+#        python generate_synthetic_data.py serve [--port N] {tgm json file}
+#
+
+import os
+import sys
+import json
+import random
+import argparse
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# kinds of TGM outputs
+errors = [
+    'tgm failure', 'syntax', 'question type', 'disconnected target',
+    'wrong range', 'disconnected triple'
+]
+
+
+def qrandom(seed, i):
+    # the i-th question is reproducible without keeping the earlier ones
+    return random.Random('{}-{}'.format(seed, i))
+
+
+def gen_query(rnd, args):
+    ask = rnd.random() < args.ask
+    noft = rnd.randint(args.min_triples, args.max_triples)
+
+    # a connected chain of triples
+    triples = []
+    for j in range(noft):
+        s = '?x{}'.format(j)
+        p = 'onto:p{}'.format(rnd.randrange(args.vocabulary))
+        if j == noft - 1 and rnd.random() < 0.5:
+            o = 'res:E{}'.format(rnd.randrange(args.vocabulary))
+        else:
+            o = '?x{}'.format(j + 1)
+        triples.append([s, p, o])
+
+    where = 'WHERE {{ {} }}'.format(' '.join(
+        ['{} {} {} .'.format(*t) for t in triples]))
+
+    if ask:
+        return {'ask': True, 'triples': triples, 'sparql': 'ASK ' + where}
+
+    if rnd.random() < args.bind:
+        head = 'SELECT (COUNT(?x0) AS ?tgm_eval_result)'
+    else:
+        head = 'SELECT DISTINCT ?x0'
+
+    tail, limit = '', None
+    if rnd.random() < args.range:
+        limit = (rnd.randint(1, 10), rnd.randint(0, 5))
+        tail = ' ORDER BY ?x0 LIMIT {} OFFSET {}'.format(*limit)
+
+    return {
+        'ask': False,
+        'triples': triples,
+        'head': head,
+        'limit': limit,
+        'sparql': '{} {}{}'.format(head, where, tail)
+    }
+
+
+def original(seed, i, args):
+    # a duplicate refers to an earlier question, which might be a duplicate
+    # too, so follow it back to the question written with its own text
+    while i > 0:
+        rnd = qrandom('{}-duplicate'.format(seed), i)
+        if rnd.random() >= args.duplicate:
+            break
+        i = rnd.randrange(i)
+
+    return i
+
+
+def gen_question(seed, i, args):
+    rnd = qrandom(seed, i)
+    q = gen_query(rnd, args)
+
+    if q['ask']:
+        string = 'Synthetic question {}: is it true?'.format(i)
+    else:
+        string = 'Synthetic question {}: what is it?'.format(i)
+
+    return rnd, string, q
+
+
+def gen_template(rnd, q, args):
+    # replace resources and properties with slot variables
+    triples = [[
+        '?s{}'.format(k * 3 + l) if ':' in n else n
+        for l, n in enumerate(t)
+    ] for k, t in enumerate(q['triples'])]
+
+    kind = 'good'
+    if rnd.random() < args.error:
+        cands = [e for e in errors if e != 'wrong range' or q.get('limit')]
+        if q['ask']:
+            cands = [e for e in cands if e != 'disconnected target']
+        kind = rnd.choice(cands)
+
+    if kind == 'tgm failure':
+        return {'status': 500, 'output': 'synthetic failure'}
+
+    if kind == 'disconnected triple':
+        triples.append(['?d0', '?d1', '?d2'])
+
+    ask = q['ask'] != (kind == 'question type')
+    where = 'WHERE {{ {} }}'.format(' '.join(
+        ['{} {} {} .'.format(*t) for t in triples]))
+
+    if ask:
+        query = 'ASK ' + where
+    else:
+        target = '?dt' if kind == 'disconnected target' else '?x0'
+        query = 'SELECT {} {}'.format(target, where)
+        if q.get('limit'):
+            lim, off = q['limit']
+            if kind == 'wrong range':
+                lim += 1
+            query += ' ORDER BY ?x0 LIMIT {} OFFSET {}'.format(lim, off)
+
+    if kind == 'syntax':
+        query = query.replace('WHERE {', 'WHERE', 1)
+
+    return {'status': 200, 'output': [{'query': query, 'score': 1.0}]}
+
+
+def open_chunk(wd, nof):
+    fn = wd + 'synthetic-{0:02d}.json'.format(nof)
+    f = open(fn, 'w')
+    f.write('{\n    "questions": [\n')
+    return f
+
+
+def close_chunk(f):
+    f.write('\n    ]\n}\n')
+    f.close()
+
+
+def generate(args):
+    wd = args.output
+    if wd[-1] != '/':
+        wd += '/'
+    if not os.path.exists(wd):
+        os.mkdir(wd)
+
+    chunk = args.chunk if args.chunk > 0 else args.size
+    nof, noq, f = 0, 0, None
+
+    # synthetic TGM responses (json lines)
+    tf = open(wd + 'synthetic-tgm.jsonl', 'w')
+
+    for i in range(args.size):
+        if noq % chunk == 0:
+            if f:
+                close_chunk(f)
+            nof += 1
+            f = open_chunk(wd, nof)
+        elif noq > 0:
+            f.write(',\n')
+
+        j = original(args.seed, i, args)
+        rnd, string, q = gen_question(args.seed, j, args)
+        f.write('        ' + json.dumps({
+            'question': [{
+                'language': 'en',
+                'string': string
+            }],
+            'query': {
+                'sparql': q['sparql']
+            }
+        }))
+        noq += 1
+
+        if j == i:
+            t = gen_template(rnd, q, args)
+            t['string'] = string
+            tf.write(json.dumps(t) + '\n')
+
+    if f:
+        close_chunk(f)
+    tf.close()
+
+    print('Prepared {} synthetic questions in {} files'.format(noq, nof))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    responses = dict()
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, code, body):
+        self.send_response(code)
+        self.send_header('content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode('utf-8'))
+
+    def do_POST(self):
+        n = int(self.headers.get('content-length', 0))
+        tgm_in = json.loads(self.rfile.read(n).decode('utf-8'))
+        batch = isinstance(tgm_in, list)
+
+        outs = []
+        for q in (tgm_in if batch else [tgm_in]):
+            r = StandInHandler.responses.get(q.get('string', None), None)
+            if r is None or r['status'] != 200:
+                if not batch:
+                    return self.respond(r['status'] if r else 404, 'error')
+
+                # a failed question in a batch gets an empty output
+                outs.append([])
+            else:
+                outs.append(r['output'])
+
+        self.respond(200, outs if batch else outs[0])
+
+
+def serve(args):
+    for l in open(args.tgm):
+        r = json.loads(l)
+        StandInHandler.responses[r.pop('string')] = r
+
+    print('Serving {} responses on port {}'.format(
+        len(StandInHandler.responses), args.port))
+    HTTPServer(('127.0.0.1', args.port), StandInHandler).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Synthetic dataset for scale testing of the evaluator')
+    sub = parser.add_subparsers(dest='command')
+
+    gp = sub.add_parser('generate', help='generate input json files')
+    gp.add_argument('--output', default='./data/')
+    gp.add_argument('--size', type=int, default=1000)
+    gp.add_argument('--chunk', type=int, default=0)
+    gp.add_argument('--seed', type=int, default=0)
+    gp.add_argument('--min-triples', type=int, default=1)
+    gp.add_argument('--max-triples', type=int, default=3)
+    gp.add_argument('--vocabulary', type=int, default=1000)
+    gp.add_argument('--ask', type=float, default=0.1)
+    gp.add_argument('--bind', type=float, default=0.1)
+    gp.add_argument('--range', type=float, default=0.05)
+    gp.add_argument('--duplicate', type=float, default=0.0)
+    gp.add_argument('--error', type=float, default=0.3)
+
+    sp = sub.add_parser('serve', help='run a stand-in TGM')
+    sp.add_argument('--port', type=int, default=8000)
+    sp.add_argument('tgm')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args)
+    elif args.command == 'serve':
+        serve(args)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()